@@ -1,12 +1,19 @@
 # Import Library 
 import os
 import uuid
+import asyncio
+import queue
+import socket
+import threading
+import time
 from google import genai
 from google.genai import types
 import base64
 import logging
 from logging.handlers import RotatingFileHandler
 from flask import Flask, render_template, request, jsonify
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 from dotenv import load_dotenv
 import json
 
@@ -16,6 +23,8 @@ load_dotenv()
 PROJECT_ID = os.getenv('PROJECT_ID')
 LOCATION = "us-central1"
 GEMINI_MODEL_NAME  = "gemini-2.0-flash-001"
+# Routing config is re-read whenever the file changes, so thresholds can be tuned without a redeploy
+ROUTING_CONFIG_PATH = os.getenv('MODEL_ROUTING_CONFIG', 'model_routing.json')
 DATASTORE_ID = os.getenv('DATASTORE_ID')
 DATASTORE_PATH = f"projects/{PROJECT_ID}/locations/global/collections/default_collection/dataStores/{DATASTORE_ID}"
 
@@ -56,6 +65,38 @@ logger.info("Logging configured to save to file and console.")
 
 # --- Initialize Flask App ---
 app = Flask(__name__)
+sock = Sock(app)
+
+# --- In-flight Answers ---
+# Maps session_id -> the answer currently being generated for it, so a cancel
+# request or a newer question for the same session can stop it early.
+active_turns = {}
+active_turns_lock = threading.Lock()
+# How long a new question waits for the answer it replaces to be saved, so turns
+# are stored in the order they were asked.
+TURN_HANDOFF_TIMEOUT = 5
+# How often a request waiting on Gemini checks for a cancel or disconnect, in seconds.
+STREAM_POLL_INTERVAL = 0.1
+
+# --- Session Storage ---
+# Saves for the same session are serialized so each one re-reads the file and
+# appends its turn, instead of overwriting turns saved by another request.
+session_locks = {}
+session_locks_lock = threading.Lock()
+
+# --- Model Routing ---
+# Used when the routing config file is missing: every question goes to one route,
+# matching the behaviour before routing existed.
+DEFAULT_ROUTING_CONFIG = {
+    "router": "heuristic",
+    "default_route": "default",
+    "routes": {
+        "default": {"model": GEMINI_MODEL_NAME, "max_output_tokens": 8192},
+    },
+}
+routing_config = DEFAULT_ROUTING_CONFIG
+routing_config_mtime = None
+routing_config_lock = threading.Lock()
 
 # --- Google Cloud Clients ---
 try:
@@ -69,6 +110,13 @@ except Exception as e:
     logger.error(f"Error initializing Google Cloud clients: {e}")
     genai_client = None
 
+# --- Gemini Event Loop ---
+# The async Gemini client pools its HTTP connections on the event loop that
+# opened them, so every answer is read on this one long-lived loop. A loop per
+# answer would leave the next answer reusing a connection of a closed loop.
+gemini_loop = asyncio.new_event_loop()
+threading.Thread(target=gemini_loop.run_forever, name="gemini-loop", daemon=True).start()
+
 # --- System Instruction for Gemini ---
 SYSTEM_INSTRUCTION_TEXT = (
     """🔧 Troubleshoot Assistant – Mobilindo Prima
@@ -545,13 +593,113 @@ Sumber: **SOP-QC-008.pdf**
 
 # --- Helper Functions ---
 
-def get_gemini_response(history: list) -> str:
-    if not genai_client:
-        logger.error("Gemini client not initialized.")
-        return "Error: Gemini client not initialized."
+def is_int(value) -> bool:
+    """True for JSON integers (bool is a subclass of int in Python, so it is excluded)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_routing_config(config: dict) -> dict:
+    """Checks a loaded routing config and returns it normalized.
+
+    Raises ValueError describing the first problem found, so a bad edit is
+    rejected as a whole instead of failing on every question.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("config must be a JSON object")
+    routes = config.get("routes")
+    if not isinstance(routes, dict) or not routes:
+        raise ValueError("'routes' must be a non-empty object")
+    for name, route in routes.items():
+        if not isinstance(route, dict) or not isinstance(route.get("model"), str) or not route["model"]:
+            raise ValueError(f"route '{name}' needs a model name")
+        if not is_int(route.get("max_output_tokens")) or route["max_output_tokens"] <= 0:
+            raise ValueError(f"route '{name}' needs a positive integer max_output_tokens")
+    if config.get("default_route") not in routes:
+        raise ValueError(f"default_route '{config.get('default_route')}' is not a defined route")
+    if config.get("router", "heuristic") not in ROUTERS:
+        raise ValueError(f"unknown router '{config.get('router')}'")
+
+    heuristic = config.get("heuristic", {})
+    if not isinstance(heuristic, dict):
+        raise ValueError("'heuristic' must be an object")
+    for key in ("lookup_route", "analysis_route"):
+        if key in heuristic and heuristic[key] not in routes:
+            raise ValueError(f"heuristic {key} '{heuristic[key]}' is not a defined route")
+    lookup_max_words = heuristic.get("lookup_max_words", 0)
+    if not is_int(lookup_max_words) or lookup_max_words < 0:
+        raise ValueError("heuristic lookup_max_words must be a non-negative integer")
+    keywords = heuristic.get("analysis_keywords", [])
+    if not isinstance(keywords, list) or not all(isinstance(k, str) and k.strip() for k in keywords):
+        raise ValueError("heuristic analysis_keywords must be a list of non-empty strings")
+
+    # Questions are lowercased before matching, so keywords must be too
+    return {
+        **config,
+        "router": config.get("router", "heuristic"),
+        "heuristic": {
+            **heuristic,
+            "lookup_max_words": lookup_max_words,
+            "analysis_keywords": [k.strip().lower() for k in keywords],
+        },
+    }
+
+def get_routing_config() -> dict:
+    """Returns the model routing config, reloading it if the file changed on disk.
+
+    An invalid file is logged and ignored, keeping the last good config.
+    """
+    global routing_config, routing_config_mtime
+    try:
+        mtime = os.path.getmtime(ROUTING_CONFIG_PATH)
+    except OSError:
+        return routing_config
 
+    with routing_config_lock:
+        if mtime != routing_config_mtime:
+            routing_config_mtime = mtime
+            try:
+                with open(ROUTING_CONFIG_PATH, 'r') as f:
+                    routing_config = validate_routing_config(json.load(f))
+                logger.info(f"Loaded model routing config from {ROUTING_CONFIG_PATH}")
+            except (OSError, json.JSONDecodeError, ValueError) as e:
+                logger.error(f"Invalid model routing config {ROUTING_CONFIG_PATH}, keeping previous config: {e}")
+    return routing_config
+
+def route_by_heuristic(question: str, config: dict) -> str:
+    """Picks a route from keywords and question length.
+
+    Only questions that explicitly ask for analysis (causes, impact,
+    evaluation, ...) go to the analysis route. Other short questions are
+    treated as factual lookups, and everything else uses the default route.
+    """
+    rules = config.get("heuristic", {})
+    text = question.lower()
+    if any(keyword in text for keyword in rules.get("analysis_keywords", [])):
+        return rules.get("analysis_route", config["default_route"])
+    if len(text.split()) <= rules.get("lookup_max_words", 0):
+        return rules.get("lookup_route", config["default_route"])
+    return config["default_route"]
+
+# Routers selectable with the "router" key of the routing config
+ROUTERS = {
+    "heuristic": route_by_heuristic,
+}
+
+def route_question(question: str) -> tuple[str, dict]:
+    """Chooses the route (model and output budget) for a question."""
+    config = get_routing_config()
+    route_name = ROUTERS[config["router"]](question, config)
+    if route_name not in config["routes"]:
+        logger.warning(f"Router returned unknown route '{route_name}', using '{config['default_route']}'.")
+        route_name = config["default_route"]
+    return route_name, config["routes"][route_name]
+
+def build_gemini_history(history: list) -> list:
+    """Converts stored chat messages into the Content list expected by Gemini."""
     gemini_history = []
     for msg in history:
+        # Cancelled turns stay in the session file but are never sent back to the model
+        if msg.get("status") == "cancelled":
+            continue
         # The 'bot' role from your JSON files must be mapped to 'model' for the API
         role = "model" if msg["role"] == "bot" else "user"
         gemini_history.append(
@@ -560,79 +708,129 @@ def get_gemini_response(history: list) -> str:
                 parts=[types.Part.from_text(text=msg["content"])]
             )
         )
-        
-    try:
-        logger.info(f"Sending to Gemini with history: {gemini_history}")
-        response = genai_client.models.generate_content(
-            model=GEMINI_MODEL_NAME,
-            contents=gemini_history, # <-- Pass the entire formatted history
-            config=types.GenerateContentConfig(
-                temperature=0.25,
-                top_p=1,
-                seed=0,
-                max_output_tokens=8192,
-                safety_settings=[types.SafetySetting(
-                    category="HARM_CATEGORY_HATE_SPEECH",
-                    threshold="OFF"
-                ), types.SafetySetting(
-                    category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                    threshold="OFF"
-                ), types.SafetySetting(
-                    category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    threshold="OFF"
-                ), types.SafetySetting(
-                    category="HARM_CATEGORY_HARASSMENT",
-                    threshold="OFF"
-                )],
-                tools=[
-                    types.Tool(
-                        retrieval=types.Retrieval(
-                            vertex_ai_search=types.VertexAISearch(
-                                datastore=DATASTORE_PATH,
-                            )
-                        )
+    return gemini_history
+
+def build_generate_config(max_output_tokens: int) -> types.GenerateContentConfig:
+    """Builds the generation config, with the output budget set by the chosen route."""
+    return types.GenerateContentConfig(
+        temperature=0.25,
+        top_p=1,
+        seed=0,
+        max_output_tokens=max_output_tokens,
+        safety_settings=[types.SafetySetting(
+            category="HARM_CATEGORY_HATE_SPEECH",
+            threshold="OFF"
+        ), types.SafetySetting(
+            category="HARM_CATEGORY_DANGEROUS_CONTENT",
+            threshold="OFF"
+        ), types.SafetySetting(
+            category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+            threshold="OFF"
+        ), types.SafetySetting(
+            category="HARM_CATEGORY_HARASSMENT",
+            threshold="OFF"
+        )],
+        tools=[
+            types.Tool(
+                retrieval=types.Retrieval(
+                    vertex_ai_search=types.VertexAISearch(
+                        datastore=DATASTORE_PATH,
                     )
-                ],
-                system_instruction=[types.Part.from_text(text=SYSTEM_INSTRUCTION_TEXT)]),
-        )
-        # logger.info(f"Gemini Raw Response: {response}")
-        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-            # Handle potential grounding metadata if using Vertex AI Search
-            full_text = ""
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, 'text'):
-                    full_text += part.text
-                elif hasattr(part, 'retrieval'): # Or check specific grounding part type
-                    logger.info(f"Grounding metadata found: {part}") # Log or process grounding
-            logger.info(f"Gemini response: {full_text}")
-            return full_text
-        else:
-            logger.error(f"Gemini response structure unexpected or empty: {response}")
-            return "Maaf, saya tidak dapat menghasilkan respons saat ini."
+                )
+            )
+        ],
+        system_instruction=[types.Part.from_text(text=SYSTEM_INSTRUCTION_TEXT)])
 
+async def stream_gemini_response(history: list, route: dict):
+    """Yields the Gemini response as text chunks while it is being generated.
 
+    `route` is the entry picked by route_question(), giving the model and
+    output budget to use.
+    """
+    if not genai_client:
+        logger.error("Gemini client not initialized.")
+        yield "Error: Gemini client not initialized."
+        return
+
+    gemini_history = build_gemini_history(history)
+
+    try:
+        logger.info(f"Streaming from Gemini with history: {gemini_history}")
+        stream = await genai_client.aio.models.generate_content_stream(
+            model=route["model"],
+            contents=gemini_history,
+            config=build_generate_config(route["max_output_tokens"]),
+        )
     except Exception as e:
-        logger.error(f"Error getting response from Gemini: {e}")
-        return f"Maaf, terjadi kesalahan saat memproses permintaan Anda ke Gemini: {e}"
-    
-# --- Flask Routes ---
-@app.route("/")
-def index():
-    """Renders the main chat page."""
-    return render_template("index.html")
+        logger.error(f"Error streaming response from Gemini: {e}")
+        yield f"Maaf, terjadi kesalahan saat memproses permintaan Anda ke Gemini: {e}"
+        return
 
-@app.route("/api/chat", methods=["POST"])
-def chat():
-    """Handles chat requests, managing conversation history."""
-    data = request.json
-    if not data or "message" not in data:
-        return jsonify({"error": "Invalid request"}), 400
+    try:
+        received_text = False
+        async for chunk in stream:
+            if not (chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts):
+                continue
+            for part in chunk.candidates[0].content.parts:
+                if part.text:
+                    received_text = True
+                    yield part.text
+        if not received_text:
+            logger.error("Gemini stream ended without any text.")
+            yield "Maaf, saya tidak dapat menghasilkan respons saat ini."
+    except Exception as e:
+        logger.error(f"Error streaming response from Gemini: {e}")
+        yield f"Maaf, terjadi kesalahan saat memproses permintaan Anda ke Gemini: {e}"
+    finally:
+        # Closes the upstream HTTP stream, also when the read is cancelled
+        await stream.aclose()
+
+class GeminiStream:
+    """Reads a Gemini response on the shared background event loop.
+
+    The request thread consumes text with iter_text(), which keeps checking
+    for a cancel or disconnect even while Gemini has not sent anything yet.
+    close() cancels the upstream read immediately instead of waiting for the
+    next chunk.
+    """
+
+    _END = object()
+
+    def __init__(self, history: list, route: dict):
+        self.completed = False
+        self._chunks = queue.Queue()
+        self._future = asyncio.run_coroutine_threadsafe(self._read(history, route), gemini_loop)
+        self._future.add_done_callback(lambda future: self._chunks.put(self._END))
+
+    async def _read(self, history: list, route: dict) -> None:
+        response = stream_gemini_response(history, route)
+        try:
+            async for text in response:
+                self._chunks.put(text)
+        finally:
+            await response.aclose()
 
-    user_message = data["message"]
-    session_id = data.get("session_id")
-    logger.info(f"Received message: '{user_message}' for session: {session_id}")
+    def iter_text(self, should_stop):
+        """Yields text as it arrives, stopping early once should_stop() returns True.
 
-    # --- Session Management ---
+        `completed` is set only if the whole response was read.
+        """
+        while not should_stop():
+            try:
+                text = self._chunks.get(timeout=STREAM_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if text is self._END:
+                self.completed = not self._future.cancelled()
+                return
+            yield text
+
+    def close(self) -> None:
+        """Cancels the upstream read if it is still running."""
+        self._future.cancel()
+
+def load_conversation(session_id: str | None, user_message: str) -> tuple[str, dict]:
+    """Loads a conversation from disk, or starts a new one if it does not exist."""
     if not session_id:
         session_id = str(uuid.uuid4())
         conversation = {
@@ -647,20 +845,297 @@ def chat():
         except FileNotFoundError:
             logger.warning(f"Session file not found for id {session_id}. Creating new one.")
             conversation = {"id": session_id, "title": user_message[:50], "messages": []}
+    return session_id, conversation
+
+def record_routing(session_id: str, route_name: str, route: dict, started: float, cancelled: bool) -> dict:
+    """Logs which route answered a question and how long it took.
+
+    Returns the same details so they can be stored with the bot message.
+    """
+    latency_ms = round((time.monotonic() - started) * 1000)
+    outcome = "cancelled after" if cancelled else "answered in"
+    logger.info(f"Route '{route_name}' ({route['model']}) {outcome} {latency_ms} ms for session: {session_id}")
+    return {"route": route_name, "model": route["model"], "latency_ms": latency_ms}
+
+def build_turn(user_message: str, bot_response: str, cancelled: bool, routing: dict) -> list:
+    """Builds the user and bot messages of one turn, marking both if it was cancelled."""
+    user = {"role": "user", "content": user_message}
+    bot = {"role": "bot", "content": bot_response, **routing}
+    if cancelled:
+        user["status"] = bot["status"] = "cancelled"
+    return [user, bot]
+
+def get_session_lock(session_id: str) -> threading.Lock:
+    """Returns the lock that serializes saves for a session."""
+    with session_locks_lock:
+        return session_locks.setdefault(session_id, threading.Lock())
+
+def session_mtime(session_id: str) -> int | None:
+    """Returns the modification time of a session file, or None if it does not exist."""
+    try:
+        return os.stat(os.path.join(sessions_dir, f"{session_id}.json")).st_mtime_ns
+    except OSError:
+        return None
+
+def save_turn(session_id: str, title: str, turn_messages: list) -> tuple[dict, int]:
+    """Appends one turn to a session file.
+
+    The file is re-read under the session lock, so turns saved by other
+    requests since this one loaded the session are kept. Returns the saved
+    conversation and the file's new modification time.
+    """
+    path = os.path.join(sessions_dir, f"{session_id}.json")
+    with get_session_lock(session_id):
+        try:
+            with open(path, 'r') as f:
+                conversation = json.load(f)
+        except FileNotFoundError:
+            conversation = {"id": session_id, "title": title, "messages": []}
+        conversation["messages"].extend(turn_messages)
+
+        # Write to a temporary file first so readers never see a half-written session
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(conversation, f, indent=4)
+        os.replace(tmp_path, path)
+        mtime = os.stat(path).st_mtime_ns
+    logger.info(f"Saved conversation for session: {session_id}")
+    return conversation, mtime
+
+class ActiveTurn:
+    """An answer being generated for a session."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+def begin_turn(session_id: str) -> ActiveTurn:
+    """Registers a new answer for a session, cancelling the one it replaces.
+
+    Waits briefly for the replaced answer to be saved so the new turn is
+    appended after it. If that takes longer than TURN_HANDOFF_TIMEOUT, the
+    new turn goes ahead: the replaced turn is recorded as cancelled and so is
+    never part of the model history, and save_turn() keeps both turns.
+    """
+    turn = ActiveTurn()
+    with active_turns_lock:
+        previous = active_turns.get(session_id)
+        active_turns[session_id] = turn
+    if previous:
+        logger.info(f"New question supersedes the answer in progress for session: {session_id}")
+        previous.cancelled.set()
+        previous.finished.wait(timeout=TURN_HANDOFF_TIMEOUT)
+    return turn
+
+def end_turn(session_id: str, turn: ActiveTurn) -> None:
+    """Unregisters an answer once it has been saved."""
+    with active_turns_lock:
+        if active_turns.get(session_id) is turn:
+            del active_turns[session_id]
+    turn.finished.set()
+
+def cancel_turn(session_id: str) -> bool:
+    """Asks the answer in progress for a session to stop. Returns False if there is none."""
+    with active_turns_lock:
+        turn = active_turns.get(session_id)
+    if turn is None:
+        return False
+    turn.cancelled.set()
+    return True
+
+def client_disconnected() -> bool:
+    """Checks whether the client of the current HTTP request has hung up.
+
+    Peeks at the raw connection exposed by Gunicorn or the Werkzeug dev
+    server; an orderly close reads as zero bytes.
+    """
+    conn = request.environ.get("gunicorn.socket") or request.environ.get("werkzeug.socket")
+    if conn is None:
+        return False
+    try:
+        return conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+def receive_json(ws, timeout=None, answering=False) -> dict | None:
+    """Reads one JSON message from a WebSocket.
+
+    Returns None if nothing arrived within `timeout` seconds. Malformed
+    payloads are answered with an error frame and also return None. When
+    `answering` is set, the error frame tells the client that the answer
+    being streamed carries on.
+    """
+    raw = ws.receive(timeout=timeout)
+    if raw is None:
+        return None
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        error = "Invalid JSON"
+    else:
+        if isinstance(data, dict):
+            return data
+        error = "Invalid request"
+    frame = {"type": "error", "error": error}
+    if answering:
+        frame["answer_continues"] = True
+    ws.send(json.dumps(frame))
+    return None
     
-    conversation["messages"].append({"role": "user", "content": user_message})
+# --- Flask Routes ---
+@app.route("/")
+def index():
+    """Renders the main chat page."""
+    return render_template("index.html")
 
-    # --- Get Bot Response ---
-    bot_response = get_gemini_response(conversation["messages"]) 
-    conversation["messages"].append({"role": "bot", "content": bot_response})
+@app.route("/api/chat", methods=["POST"])
+def chat():
+    """Handles chat requests, managing conversation history."""
+    data = request.json
+    if not data or "message" not in data:
+        return jsonify({"error": "Invalid request"}), 400
 
-    # --- Save Conversation ---
-    with open(os.path.join(sessions_dir, f"{session_id}.json"), 'w') as f:
-        json.dump(conversation, f, indent=4)
-    
-    logger.info(f"Saved conversation for session: {session_id}")
-    return jsonify({"response": bot_response, "session_id": session_id})
+    user_message = data["message"]
+    session_id = data.get("session_id")
+    logger.info(f"Received message: '{user_message}' for session: {session_id}")
+
+    # --- Session Management ---
+    # Register before loading so a replaced answer is saved first
+    turn = begin_turn(session_id) if session_id else None
+    session_id, conversation = load_conversation(session_id, user_message)
+    turn = turn or begin_turn(session_id)
+    history = conversation["messages"] + [{"role": "user", "content": user_message}]
+
+    try:
+        # --- Get Bot Response ---
+        # Read on a background thread so a cancel or disconnect can stop it at any point
+        chunks = []
+        route_name, route = route_question(user_message)
+        started = time.monotonic()
+        stream = GeminiStream(history, route)
+        try:
+            for text in stream.iter_text(lambda: turn.cancelled.is_set() or client_disconnected()):
+                chunks.append(text)
+        finally:
+            stream.close()
+        cancelled = not stream.completed
+
+        bot_response = "".join(chunks)
+        if cancelled:
+            logger.info(f"Answer cancelled for session: {session_id}")
+        routing = record_routing(session_id, route_name, route, started, cancelled)
+
+        # --- Save Conversation ---
+        save_turn(session_id, conversation["title"], build_turn(user_message, bot_response, cancelled, routing))
+    finally:
+        end_turn(session_id, turn)
+
+    result = {"response": bot_response, "session_id": session_id}
+    if cancelled:
+        result["cancelled"] = True
+    return jsonify(result)
+
+@sock.route("/ws/chat")
+def chat_ws(ws):
+    """Persistent chat channel with the same session semantics as /api/chat.
+
+    The conversation is kept in memory while the socket is open, and is only
+    re-read from disk when the client switches sessions or another writer
+    (a second tab, an HTTP fallback request) has changed the file. Bot
+    responses are pushed as "token" frames followed by a "done" frame. A
+    {"type": "cancel"} frame, a new question, or the socket closing stops the
+    answer currently being generated and records the turn as cancelled.
+    """
+    session_id = None
+    conversation = None
+    conversation_mtime = None
+    pending = []
+    logger.info("WebSocket chat channel opened.")
 
+    try:
+        while True:
+            data = pending.pop(0) if pending else receive_json(ws)
+            if data is None or data.get("type") == "cancel":
+                continue
+            if not data.get("message"):
+                ws.send(json.dumps({"type": "error", "error": "Invalid request"}))
+                continue
+
+            user_message = data["message"]
+            requested_session_id = data.get("session_id")
+            logger.info(f"Received WebSocket message: '{user_message}' for session: {requested_session_id}")
+
+            # --- Session Management ---
+            # Only read the file when switching sessions or when someone else saved to it.
+            if (conversation is None or requested_session_id != session_id
+                    or session_mtime(session_id) != conversation_mtime):
+                # Stat before reading, so a save landing in between triggers another reload
+                conversation_mtime = session_mtime(requested_session_id) if requested_session_id else None
+                session_id, conversation = load_conversation(requested_session_id, user_message)
+            history = conversation["messages"] + [{"role": "user", "content": user_message}]
+            ws.send(json.dumps({"type": "session", "session_id": session_id}))
+
+            # --- Stream Bot Response ---
+            turn = begin_turn(session_id)
+            try:
+                chunks = []
+                disconnected = False
+                route_name, route = route_question(user_message)
+                started = time.monotonic()
+
+                def should_stop():
+                    if turn.cancelled.is_set():
+                        return True
+                    incoming = receive_json(ws, timeout=0, answering=True)
+                    if incoming is None:
+                        return False
+                    # Both a cancel frame and a corrected question stop the current answer
+                    if incoming.get("type") != "cancel":
+                        pending.append(incoming)
+                    return True
+
+                stream = GeminiStream(history, route)
+                try:
+                    for text in stream.iter_text(should_stop):
+                        chunks.append(text)
+                        ws.send(json.dumps({"type": "token", "text": text}))
+                except ConnectionClosed:
+                    disconnected = True
+                finally:
+                    stream.close()
+                cancelled = not stream.completed
+
+                bot_response = "".join(chunks)
+                if cancelled:
+                    logger.info(f"Answer cancelled for session: {session_id}")
+                routing = record_routing(session_id, route_name, route, started, cancelled)
+
+                # --- Save Conversation ---
+                conversation, conversation_mtime = save_turn(
+                    session_id, conversation["title"], build_turn(user_message, bot_response, cancelled, routing))
+            finally:
+                end_turn(session_id, turn)
+
+            if disconnected:
+                logger.info(f"WebSocket chat channel closed for session: {session_id}")
+                return
+            if cancelled:
+                ws.send(json.dumps({"type": "cancelled", "response": bot_response, "session_id": session_id}))
+            else:
+                ws.send(json.dumps({"type": "done", "response": bot_response, "session_id": session_id}))
+    except ConnectionClosed:
+        logger.info(f"WebSocket chat channel closed for session: {session_id}")
+
+
+@app.route("/api/chat/<session_id>/cancel", methods=["POST"])
+def cancel_chat(session_id):
+    """Stops the answer currently being generated for a session."""
+    if not cancel_turn(session_id):
+        return jsonify({"error": "No answer in progress"}), 404
+    logger.info(f"Cancel requested for session: {session_id}")
+    return jsonify({"cancelled": True, "session_id": session_id})
 
 @app.route("/api/history", methods=["GET"])
 def get_history():
@@ -4,12 +4,23 @@ document.addEventListener("DOMContentLoaded", function() {
     const chatHistory = document.getElementById('chat-history');
     const newChatBtn = document.getElementById('new-chat-btn');
     const recentChatsList = document.getElementById('recent-chats-list');
+    const stopButton = document.getElementById('stop-button');
+
+    const SOCKET_RETRY_MIN_MS = 2000;
+    const SOCKET_RETRY_MAX_MS = 60000;
 
     let currentSessionId = null;
+    let socket = null;           // Open WebSocket, or null while falling back to HTTP
+    let socketRetryMs = SOCKET_RETRY_MIN_MS;
+    let activeReply = null;      // Answer currently being generated (socket stream or HTTP request)
+    let pendingAnswer = null;    // Promise that settles once that answer has been rendered
 
     // --- Event Listeners ---
     chatForm.addEventListener('submit', handleFormSubmit);
     newChatBtn.addEventListener('click', startNewChat);
+    stopButton.addEventListener('click', cancelActiveReply);
+    // Closing the tab should not leave the server generating an answer nobody will read
+    window.addEventListener('pagehide', cancelActiveReply);
 
     /**
      * Handles the submission of the chat form.
@@ -19,25 +30,33 @@ document.addEventListener("DOMContentLoaded", function() {
         event.preventDefault();
         const userMessage = userInput.value.trim();
         if (userMessage === '') return;
+        userInput.value = '';
+
+        // A corrected question replaces the answer still being generated
+        if (pendingAnswer) {
+            cancelActiveReply();
+            await pendingAnswer;
+        }
 
         appendMessage(userMessage, 'user');
-        userInput.value = '';
         showTypingIndicator();
 
+        const answer = askQuestion(userMessage);
+        pendingAnswer = answer;
+        await answer;
+        if (pendingAnswer === answer) pendingAnswer = null;
+    }
+
+    /**
+     * Sends a question over the socket (or HTTP as a fallback) and renders the answer.
+     * @param {string} userMessage - The message typed by the user.
+     */
+    async function askQuestion(userMessage) {
+        stopButton.hidden = false;
         try {
-            const response = await fetch('/api/chat', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: userMessage, session_id: currentSessionId }),
-            });
+            const data = socket ? await sendViaSocket(userMessage) : await sendViaHttp(userMessage);
 
             removeTypingIndicator();
-
-            if (!response.ok) {
-                throw new Error(`Server error: ${response.status}`);
-            }
-
-            const data = await response.json();
             
             // If it was a new chat, update the session ID and refresh history
             if (!currentSessionId) {
@@ -47,12 +66,152 @@ document.addEventListener("DOMContentLoaded", function() {
             
             // Highlight the current chat as active
             setActiveChat(currentSessionId);
-            appendMessage(data.response, 'bot');
+            if (!data.streamed && data.response) {
+                appendMessage(data.response, 'bot');
+            }
+            if (data.cancelled) {
+                appendMessage('Jawaban dibatalkan.', 'bot-error');
+            }
 
         } catch (error) {
-            console.error('Error fetching chat response:', error);
             removeTypingIndicator();
-            appendMessage('Maaf, terjadi kesalahan saat menghubungi server.', 'bot-error');
+            if (error.name === 'AbortError') {
+                appendMessage('Jawaban dibatalkan.', 'bot-error');
+            } else {
+                console.error('Error fetching chat response:', error);
+                appendMessage('Maaf, terjadi kesalahan saat menghubungi server.', 'bot-error');
+            }
+        } finally {
+            activeReply = null;
+            stopButton.hidden = true;
+        }
+    }
+
+    /**
+     * Sends a message through the HTTP endpoint. Used whenever the WebSocket is unavailable.
+     * @param {string} userMessage - The message typed by the user.
+     * @returns {Promise<Object>} The parsed JSON response.
+     */
+    async function sendViaHttp(userMessage) {
+        const controller = new AbortController();
+        activeReply = { controller };
+
+        const response = await fetch('/api/chat', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ message: userMessage, session_id: currentSessionId }),
+            signal: controller.signal,
+        });
+
+        if (!response.ok) {
+            throw new Error(`Server error: ${response.status}`);
+        }
+
+        return response.json();
+    }
+
+    /**
+     * Sends a message through the WebSocket and resolves once the answer is complete.
+     * @param {string} userMessage - The message typed by the user.
+     * @returns {Promise<Object>} The final "done" or "cancelled" frame data.
+     */
+    function sendViaSocket(userMessage) {
+        return new Promise((resolve, reject) => {
+            activeReply = { text: '', content: null, resolve, reject };
+            socket.send(JSON.stringify({ type: 'message', message: userMessage, session_id: currentSessionId }));
+        });
+    }
+
+    /**
+     * Asks the server to stop generating the current answer.
+     */
+    function cancelActiveReply() {
+        if (!activeReply) return;
+
+        if (activeReply.controller) {
+            // The server also notices the dropped request, but only between chunks
+            if (currentSessionId) {
+                navigator.sendBeacon(`/api/chat/${currentSessionId}/cancel`);
+            }
+            activeReply.controller.abort();
+        } else if (socket) {
+            socket.send(JSON.stringify({ type: 'cancel' }));
+        }
+    }
+
+    /**
+     * Clears the active socket reply and returns it so its promise can be settled.
+     * @returns {Object} The reply that was active.
+     */
+    function finishActiveReply() {
+        const reply = activeReply;
+        activeReply = null;
+        return reply;
+    }
+
+    /**
+     * Opens the chat WebSocket, reconnecting with backoff when it closes.
+     * Messages go over HTTP until the socket is open.
+     */
+    function connectSocket() {
+        if (!('WebSocket' in window)) return;
+
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const ws = new WebSocket(`${protocol}//${window.location.host}/ws/chat`);
+
+        ws.addEventListener('open', () => {
+            socket = ws;
+            socketRetryMs = SOCKET_RETRY_MIN_MS;
+        });
+        ws.addEventListener('message', handleSocketMessage);
+        ws.addEventListener('close', () => {
+            if (socket === ws) {
+                socket = null;
+                if (activeReply && !activeReply.controller) {
+                    finishActiveReply().reject(new Error('WebSocket closed'));
+                }
+            }
+            setTimeout(connectSocket, socketRetryMs);
+            socketRetryMs = Math.min(socketRetryMs * 2, SOCKET_RETRY_MAX_MS);
+        });
+    }
+
+    /**
+     * Handles a frame pushed by the server over the WebSocket.
+     * @param {MessageEvent} event - The WebSocket message event.
+     */
+    function handleSocketMessage(event) {
+        const data = JSON.parse(event.data);
+        if (!activeReply || activeReply.controller) return;
+
+        switch (data.type) {
+            case 'token':
+                if (!activeReply.content) {
+                    removeTypingIndicator();
+                    activeReply.content = appendMessage('', 'bot');
+                }
+                activeReply.text += data.text;
+                renderBotMessage(activeReply.content, activeReply.text);
+                chatHistory.scrollTop = chatHistory.scrollHeight;
+                break;
+            case 'done': {
+                const reply = finishActiveReply();
+                reply.resolve({ response: data.response, session_id: data.session_id, streamed: reply.content !== null });
+                break;
+            }
+            case 'cancelled': {
+                const reply = finishActiveReply();
+                reply.resolve({ response: data.response, session_id: data.session_id, streamed: reply.content !== null, cancelled: true });
+                break;
+            }
+            case 'error':
+                // A malformed frame sent while an answer streams does not stop that answer
+                if (data.answer_continues) {
+                    console.warn('WebSocket frame rejected:', data.error);
+                    break;
+                }
+                finishActiveReply().reject(new Error(data.error));
+                break;
         }
     }
 
@@ -60,6 +219,7 @@ document.addEventListener("DOMContentLoaded", function() {
      * Appends a message to the chat history container and formats it.
      * @param {string} message - The text content of the message.
      * @param {string} sender - The sender type ('user', 'bot', 'bot-error').
+     * @returns {HTMLElement} The message content element.
      */
     function appendMessage(message, sender) {
         const messageWrapper = document.createElement('div');
@@ -69,10 +229,7 @@ document.addEventListener("DOMContentLoaded", function() {
         messageContent.className = 'message-content';
 
         if (sender === 'bot') {
-            // First, replace citation markers like [1] with a styled element
-            const formattedMessage = message.replace(/\[(\d+)\]/g, '<sup class="citation-marker">$1</sup>');
-            // Then, parse the rest of the markdown
-            messageContent.innerHTML = marked.parse(formattedMessage);
+            renderBotMessage(messageContent, message);
         } else {
             messageContent.textContent = message;
         }
@@ -80,6 +237,19 @@ document.addEventListener("DOMContentLoaded", function() {
         messageWrapper.appendChild(messageContent);
         chatHistory.appendChild(messageWrapper);
         chatHistory.scrollTop = chatHistory.scrollHeight;
+        return messageContent;
+    }
+
+    /**
+     * Renders a bot message as markdown into the given element.
+     * @param {HTMLElement} element - The message content element.
+     * @param {string} message - The markdown text of the message.
+     */
+    function renderBotMessage(element, message) {
+        // First, replace citation markers like [1] with a styled element
+        const formattedMessage = message.replace(/\[(\d+)\]/g, '<sup class="citation-marker">$1</sup>');
+        // Then, parse the rest of the markdown
+        element.innerHTML = marked.parse(formattedMessage);
     }
 
     /**
@@ -121,7 +291,12 @@ document.addEventListener("DOMContentLoaded", function() {
             currentSessionId = conversation.id;
 
             conversation.messages.forEach(msg => {
-                appendMessage(msg.content, msg.role);
+                if (msg.content) {
+                    appendMessage(msg.content, msg.role);
+                }
+                if (msg.role === 'bot' && msg.status === 'cancelled') {
+                    appendMessage('Jawaban dibatalkan.', 'bot-error');
+                }
             });
             setActiveChat(sessionId);
         } catch (error) {
@@ -176,4 +351,5 @@ document.addEventListener("DOMContentLoaded", function() {
     
     // --- Initial Load ---
     loadRecentChats();
+    connectSocket();
 });
\ No newline at end of file
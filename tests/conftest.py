@@ -0,0 +1,146 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import types as pytypes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from werkzeug.serving import make_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def fake_chunk(text):
+    """Builds an object shaped like a streamed GenerateContentResponse."""
+    content = pytypes.SimpleNamespace(parts=[pytypes.SimpleNamespace(text=text)])
+    return pytypes.SimpleNamespace(candidates=[pytypes.SimpleNamespace(content=content)])
+
+
+class FakeModels:
+    """Stand-in for genai_client.aio.models that streams canned chunks.
+
+    `closed` is set once the upstream stream has been closed, whether it
+    finished or was cancelled.
+    """
+
+    def __init__(self, chunks=("jawaban",), first_chunk_delay=0.0, chunk_delay=0.0):
+        self.chunks = list(chunks)
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.calls = []
+        self.started = threading.Event()
+        self.closed = threading.Event()
+
+    async def generate_content_stream(self, model, contents, config):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+
+        async def stream():
+            self.started.set()
+            try:
+                await asyncio.sleep(self.first_chunk_delay)
+                for i, text in enumerate(self.chunks):
+                    if i:
+                        await asyncio.sleep(self.chunk_delay)
+                    yield fake_chunk(text)
+            finally:
+                self.closed.set()
+
+        return stream()
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Answers streamGenerateContent the way the Gemini Developer API does.
+
+    Responses are server-sent events over keep-alive HTTP/1.1, so the SDK
+    reuses its pooled connections between answers as it would in production.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, text in enumerate(self.server.chunks):
+            if i:
+                time.sleep(self.server.chunk_delay)
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_gemini(chunks=("jawaban",), chunk_delay=0.0):
+    """Starts a StubGeminiHandler server on a random local port; returns the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+    server.daemon_threads = True
+    server.chunks = list(chunks)
+    server.chunk_delay = chunk_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def real_gemini_client(port):
+    """A real genai.Client in Developer API mode, pointed at the stub server on `port`."""
+    from google import genai
+    return genai.Client(api_key="test-key",
+                        http_options={"base_url": f"http://127.0.0.1:{port}"})
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    # app.py creates its log and session directories in the working directory on import
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        module = importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
+    module.ROUTING_CONFIG_PATH = os.path.join(REPO_ROOT, "model_routing.json")
+    return module
+
+
+@pytest.fixture
+def sessions_dir(app_module, tmp_path, monkeypatch):
+    path = tmp_path / "chat_sessions"
+    path.mkdir()
+    monkeypatch.setattr(app_module, "sessions_dir", str(path))
+    return path
+
+
+@pytest.fixture
+def fake_gemini(app_module, monkeypatch):
+    """Returns a function that installs a FakeModels as the Gemini client."""
+    def install(**kwargs):
+        models = FakeModels(**kwargs)
+        client = pytypes.SimpleNamespace(aio=pytypes.SimpleNamespace(models=models))
+        monkeypatch.setattr(app_module, "genai_client", client)
+        return models
+    return install
+
+
+@pytest.fixture
+def live_server(app_module, sessions_dir):
+    """Serves the app on a random local port; yields its host:port."""
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def read_session(sessions_dir, session_id):
+    with open(sessions_dir / f"{session_id}.json") as f:
+        return json.load(f)
@@ -0,0 +1,162 @@
+"""Load test: how many /ws/chat sessions one instance keeps open and responsive.
+
+Starts Gunicorn with the same worker settings as the Dockerfile. Then opens N
+sockets at once and sends one question on every socket that completed its
+handshake.
+
+By default Gemini is replaced by the FakeModels client from conftest.py, so
+the numbers leave out the SDK and its connection pooling. With --real-sdk the
+app uses a real genai.Client against a local stub server instead, which
+exercises the full streaming path except the network to Google.
+
+    python tests/load_ws_sessions.py --sessions 150 --threads 100
+    python tests/load_ws_sessions.py --sessions 150 --threads 100 --real-sdk
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types as pytypes
+
+from simple_websocket import Client
+
+from conftest import REPO_ROOT, FakeModels, real_gemini_client, start_stub_gemini
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ANSWER_CHUNKS = ["jawaban ", "singkat ", "selesai"]
+
+
+def create_fake_app():
+    """Gunicorn app factory: the real app with Gemini replaced.
+
+    If STUB_GEMINI_PORT is set, Gemini is a real genai.Client talking to the
+    stub server on that port; otherwise it is FakeModels.
+    """
+    import app
+    from google.genai import types
+    stub_port = os.environ.get("STUB_GEMINI_PORT")
+    if stub_port:
+        app.genai_client = real_gemini_client(int(stub_port))
+        # Developer API mode rejects the Vertex AI Search retrieval tool
+        app.build_generate_config = lambda max_output_tokens: types.GenerateContentConfig(
+            max_output_tokens=max_output_tokens)
+    else:
+        models = FakeModels(chunks=ANSWER_CHUNKS, first_chunk_delay=0.2, chunk_delay=0.05)
+        app.genai_client = pytypes.SimpleNamespace(aio=pytypes.SimpleNamespace(models=models))
+    app.ROUTING_CONFIG_PATH = os.path.join(REPO_ROOT, "model_routing.json")
+    return app.app
+
+
+def start_gunicorn(port, workers, threads, workdir, stub_port=None):
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--bind", f"127.0.0.1:{port}",
+        "--worker-class", "gthread", "--workers", str(workers), "--threads", str(threads),
+        "--chdir", workdir, "--pythonpath", f"{REPO_ROOT},{TESTS_DIR}",
+        "--log-level", "warning",
+        *(["--env", f"STUB_GEMINI_PORT={stub_port}"] if stub_port else []),
+        "load_ws_sessions:create_fake_app()",
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Gunicorn did not start")
+
+
+def open_sockets(url, count, timeout):
+    """Opens `count` sockets in parallel; returns those whose handshake finished in time."""
+    opened = []
+    lock = threading.Lock()
+
+    def connect():
+        try:
+            ws = Client.connect(url)
+        except Exception:
+            return
+        with lock:
+            opened.append(ws)
+
+    for _ in range(count):
+        threading.Thread(target=connect, daemon=True).start()
+    time.sleep(timeout)
+    with lock:
+        return list(opened)
+
+
+def ask(ws, index, latencies, timeout):
+    """Sends one question and records the time until its "done" frame."""
+    started = time.monotonic()
+    try:
+        ws.send(json.dumps({"type": "message", "message": f"Berapa nomor SOP {index}?", "session_id": None}))
+        while True:
+            raw = ws.receive(timeout=max(0.0, started + timeout - time.monotonic()))
+            if raw is None:
+                return
+            if json.loads(raw)["type"] == "done":
+                latencies.append(time.monotonic() - started)
+                return
+    except Exception:
+        return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=150, help="sockets to open")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for handshakes and answers")
+    parser.add_argument("--real-sdk", action="store_true",
+                        help="use a real genai.Client against a local stub server instead of FakeModels")
+    args = parser.parse_args()
+
+    # The stub runs in this process, so it does not compete with the app for its worker's threads
+    stub = start_stub_gemini(chunks=ANSWER_CHUNKS, chunk_delay=0.05) if args.real_sdk else None
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_gunicorn(args.port, args.workers, args.threads, workdir,
+                                stub.server_port if stub else None)
+        try:
+            sockets = open_sockets(f"ws://127.0.0.1:{args.port}/ws/chat", args.sessions, args.timeout)
+
+            latencies = []
+            askers = [threading.Thread(target=ask, args=(ws, i, latencies, args.timeout))
+                      for i, ws in enumerate(sockets)]
+            for asker in askers:
+                asker.start()
+            for asker in askers:
+                asker.join()
+
+            print(f"gemini client:      {'real SDK + local stub' if stub else 'FakeModels'}")
+            print(f"workers x threads:  {args.workers} x {args.threads}")
+            print(f"sockets requested:  {args.sessions}")
+            print(f"sockets open:       {len(sockets)}")
+            print(f"sockets responsive: {len(latencies)}")
+            if latencies:
+                print(f"answer latency:     median {statistics.median(latencies) * 1000:.0f} ms, "
+                      f"max {max(latencies) * 1000:.0f} ms")
+            for ws in sockets:
+                ws.close()
+        finally:
+            # Queued handshakes keep a graceful shutdown waiting, so don't wait long
+            server.terminate()
+            try:
+                server.wait(5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
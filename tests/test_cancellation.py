@@ -0,0 +1,212 @@
+import http.client
+import json
+import socket
+import threading
+import time
+
+from simple_websocket import Client
+
+from conftest import read_session
+
+# A cancelled answer must free its worker well within this many seconds
+RELEASE_BUDGET = 1.0
+
+
+def post_json(server, path, body=None):
+    conn = http.client.HTTPConnection(server, timeout=30)
+    conn.request("POST", path, body=json.dumps(body) if body is not None else None,
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def start_chat(server, message, session_id):
+    """Posts to /api/chat on a background thread; returns the thread and its result dict."""
+    result = {}
+
+    def run():
+        result["response"] = post_json(server, "/api/chat", {"message": message, "session_id": session_id})
+        result["finished_at"] = time.monotonic()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def wait_for_saved_turn(sessions_dir, session_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return read_session(sessions_dir, session_id)
+        except (FileNotFoundError, json.JSONDecodeError):
+            time.sleep(0.01)
+    raise AssertionError(f"session {session_id} was never saved")
+
+
+def assert_cancelled_turn(conversation, question):
+    user, bot = conversation["messages"][-2:]
+    assert user == {"role": "user", "content": question, "status": "cancelled"}
+    assert bot["role"] == "bot"
+    assert bot["status"] == "cancelled"
+
+
+def ws_receive(ws, timeout=5):
+    raw = ws.receive(timeout=timeout)
+    assert raw is not None, "no frame received"
+    return json.loads(raw)
+
+
+def test_cancel_endpoint_releases_worker_mid_stream(live_server, sessions_dir, fake_gemini):
+    gemini = fake_gemini(chunks=[f"token{i} " for i in range(200)], chunk_delay=0.05)
+    thread, result = start_chat(live_server, "Bagaimana detail insiden?", "s-cancel")
+    assert gemini.started.wait(5)
+    time.sleep(0.2)
+
+    cancelled_at = time.monotonic()
+    assert post_json(live_server, "/api/chat/s-cancel/cancel") == (200, {"cancelled": True, "session_id": "s-cancel"})
+    thread.join(5)
+
+    assert result["finished_at"] - cancelled_at < RELEASE_BUDGET
+    status, body = result["response"]
+    assert status == 200
+    assert body["cancelled"] is True
+    assert body["response"].startswith("token0 ")
+    assert gemini.closed.wait(RELEASE_BUDGET)
+    conversation = read_session(sessions_dir, "s-cancel")
+    assert_cancelled_turn(conversation, "Bagaimana detail insiden?")
+    assert conversation["messages"][-1]["content"] == body["response"]
+
+
+def test_cancel_endpoint_releases_worker_before_first_chunk(live_server, sessions_dir, fake_gemini):
+    gemini = fake_gemini(first_chunk_delay=8)
+    thread, result = start_chat(live_server, "Apa akar masalahnya?", "s-slow")
+    assert gemini.started.wait(5)
+
+    cancelled_at = time.monotonic()
+    assert post_json(live_server, "/api/chat/s-slow/cancel")[0] == 200
+    thread.join(5)
+
+    assert result["finished_at"] - cancelled_at < RELEASE_BUDGET
+    assert result["response"][1] == {"cancelled": True, "response": "", "session_id": "s-slow"}
+    assert gemini.closed.wait(RELEASE_BUDGET)
+    assert_cancelled_turn(read_session(sessions_dir, "s-slow"), "Apa akar masalahnya?")
+
+
+def test_cancel_without_answer_in_progress_returns_404(live_server):
+    status, body = post_json(live_server, "/api/chat/unknown/cancel")
+    assert status == 404
+    assert body == {"error": "No answer in progress"}
+
+
+def test_http_disconnect_aborts_upstream(live_server, sessions_dir, fake_gemini):
+    gemini = fake_gemini(first_chunk_delay=8)
+    host, port = live_server.split(":")
+    body = json.dumps({"message": "Kenapa bocor?", "session_id": "s-gone"}).encode()
+    conn = socket.create_connection((host, int(port)))
+    conn.sendall(b"POST /api/chat HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n"
+                 b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+    assert gemini.started.wait(5)
+
+    conn.close()
+    closed_at = time.monotonic()
+
+    assert gemini.closed.wait(RELEASE_BUDGET)
+    conversation = wait_for_saved_turn(sessions_dir, "s-gone")
+    assert time.monotonic() - closed_at < RELEASE_BUDGET
+    assert_cancelled_turn(conversation, "Kenapa bocor?")
+
+
+def test_new_question_supersedes_answer_in_progress(live_server, sessions_dir, fake_gemini, app_module, monkeypatch):
+    post_json(live_server, "/api/chat", {"message": "hello first", "session_id": "s-fix"})
+    gemini = fake_gemini(first_chunk_delay=8)
+    thread, result = start_chat(live_server, "slow question", "s-fix")
+    assert gemini.started.wait(5)
+
+    # The replaced turn no longer blocks, so even without the handoff wait nothing is lost
+    monkeypatch.setattr(app_module, "TURN_HANDOFF_TIMEOUT", 0)
+    fake_gemini(chunks=["corrected answer"])
+    status, body = post_json(live_server, "/api/chat", {"message": "corrected", "session_id": "s-fix"})
+    thread.join(5)
+
+    assert status == 200
+    assert body["response"] == "corrected answer"
+    assert result["response"][1]["cancelled"] is True
+    messages = read_session(sessions_dir, "s-fix")["messages"]
+    contents = [(m["content"], m.get("status")) for m in messages]
+    assert ("hello first", None) in contents
+    assert ("corrected", None) in contents
+    assert ("corrected answer", None) in contents
+    assert ("slow question", "cancelled") in contents
+    assert len(messages) == 6
+
+
+def test_websocket_cancel_frame(live_server, sessions_dir, fake_gemini):
+    gemini = fake_gemini(first_chunk_delay=8)
+    ws = Client.connect(f"ws://{live_server}/ws/chat")
+    try:
+        ws.send(json.dumps({"type": "message", "message": "Apa dampaknya?", "session_id": "s-ws"}))
+        assert ws_receive(ws) == {"type": "session", "session_id": "s-ws"}
+        assert gemini.started.wait(5)
+
+        cancelled_at = time.monotonic()
+        ws.send(json.dumps({"type": "cancel"}))
+        frame = ws_receive(ws)
+
+        assert time.monotonic() - cancelled_at < RELEASE_BUDGET
+        assert frame == {"type": "cancelled", "response": "", "session_id": "s-ws"}
+        assert gemini.closed.wait(RELEASE_BUDGET)
+        assert_cancelled_turn(read_session(sessions_dir, "s-ws"), "Apa dampaknya?")
+    finally:
+        ws.close()
+
+
+def test_websocket_malformed_frame_does_not_stop_answer(live_server, sessions_dir, fake_gemini):
+    fake_gemini(chunks=[f"token{i} " for i in range(10)], chunk_delay=0.05)
+    ws = Client.connect(f"ws://{live_server}/ws/chat")
+    try:
+        ws.send(json.dumps({"type": "message", "message": "Apa dampaknya?", "session_id": "s-ws-bad"}))
+        assert ws_receive(ws)["type"] == "session"
+        assert ws_receive(ws)["type"] == "token"
+
+        ws.send("{not json")
+        frames = []
+        while not frames or frames[-1]["type"] not in ("done", "cancelled"):
+            frames.append(ws_receive(ws))
+
+        assert {"type": "error", "error": "Invalid JSON", "answer_continues": True} in frames
+        assert frames[-1]["type"] == "done"
+        assert frames[-1]["response"] == "".join(f"token{i} " for i in range(10))
+        bot = read_session(sessions_dir, "s-ws-bad")["messages"][-1]
+        assert "status" not in bot
+    finally:
+        ws.close()
+
+
+def test_websocket_disconnect_aborts_upstream(live_server, sessions_dir, fake_gemini):
+    gemini = fake_gemini(chunks=[f"token{i} " for i in range(200)], chunk_delay=0.05)
+    ws = Client.connect(f"ws://{live_server}/ws/chat")
+    ws.send(json.dumps({"type": "message", "message": "Jelaskan RCA", "session_id": "s-ws-gone"}))
+    assert ws_receive(ws)["type"] == "session"
+    assert ws_receive(ws)["type"] == "token"
+
+    ws.close()
+    closed_at = time.monotonic()
+
+    assert gemini.closed.wait(RELEASE_BUDGET)
+    conversation = wait_for_saved_turn(sessions_dir, "s-ws-gone")
+    assert time.monotonic() - closed_at < RELEASE_BUDGET
+    assert_cancelled_turn(conversation, "Jelaskan RCA")
+
+
+def test_cancelled_turns_are_left_out_of_model_history(app_module):
+    history = [
+        {"role": "user", "content": "first"},
+        {"role": "bot", "content": "answer"},
+        {"role": "user", "content": "stopped", "status": "cancelled"},
+        {"role": "bot", "content": "part", "status": "cancelled"},
+        {"role": "user", "content": "second"},
+    ]
+    contents = app_module.build_gemini_history(history)
+    assert [(c.role, c.parts[0].text) for c in contents] == [
+        ("user", "first"), ("model", "answer"), ("user", "second"),
+    ]
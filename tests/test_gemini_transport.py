@@ -0,0 +1,63 @@
+import pytest
+from google.genai import types
+
+from conftest import read_session, real_gemini_client, start_stub_gemini
+
+ROUTE = {"model": "gemini-2.0-flash-001", "max_output_tokens": 1024}
+
+
+@pytest.fixture
+def real_gemini(app_module, monkeypatch):
+    """Returns a function that installs a real genai.Client talking to a stub server."""
+    servers = []
+    # Developer API mode rejects the Vertex AI Search retrieval tool
+    monkeypatch.setattr(app_module, "build_generate_config",
+                        lambda max_output_tokens: types.GenerateContentConfig(max_output_tokens=max_output_tokens))
+
+    def install(**kwargs):
+        server = start_stub_gemini(**kwargs)
+        servers.append(server)
+        monkeypatch.setattr(app_module, "genai_client", real_gemini_client(server.server_port))
+        return server
+
+    yield install
+    for server in servers:
+        server.shutdown()
+
+
+def read_answer(app_module, question):
+    stream = app_module.GeminiStream([{"role": "user", "content": question}], ROUTE)
+    try:
+        text = "".join(stream.iter_text(lambda: False))
+    finally:
+        stream.close()
+    return text, stream.completed
+
+
+def test_consecutive_answers_reuse_pooled_connections(app_module, real_gemini):
+    real_gemini(chunks=["jawaban ", "lengkap"])
+
+    for question in ["pertama", "kedua", "ketiga"]:
+        assert read_answer(app_module, question) == ("jawaban lengkap", True)
+
+
+def test_answer_after_cancelled_answer(app_module, real_gemini):
+    real_gemini(chunks=[f"token{i} " for i in range(50)], chunk_delay=0.02)
+    stream = app_module.GeminiStream([{"role": "user", "content": "dibatalkan"}], ROUTE)
+    texts = stream.iter_text(lambda: False)
+    assert next(texts) == "token0 "
+    stream.close()
+
+    assert read_answer(app_module, "berikutnya") == ("".join(f"token{i} " for i in range(50)), True)
+
+
+def test_chat_saves_consecutive_answers(app_module, real_gemini, sessions_dir):
+    real_gemini(chunks=["SOP - PROD - 012"])
+    client = app_module.app.test_client()
+
+    for question in ["Berapa nomor SOP?", "Berapa nomor SOP lagi?"]:
+        response = client.post("/api/chat", json={"message": question, "session_id": "s-real"})
+        assert response.get_json()["response"] == "SOP - PROD - 012"
+
+    bots = [m for m in read_session(sessions_dir, "s-real")["messages"] if m["role"] == "bot"]
+    assert [(m["content"], m.get("status")) for m in bots] == [("SOP - PROD - 012", None)] * 2
@@ -0,0 +1,149 @@
+import copy
+import json
+import os
+
+import pytest
+
+from conftest import REPO_ROOT, read_session
+
+with open(os.path.join(REPO_ROOT, "model_routing.json")) as f:
+    SHIPPED_CONFIG = json.load(f)
+
+# Example questions from SYSTEM_INSTRUCTION_TEXT and the route they should take
+EXAMPLE_ROUTES = [
+    ("Bagaimana detail insiden kebocoran minyak rem ?", "analysis"),
+    ("Apa penyebab insiden Kebocoran Minyak Rem Pikap-Kuat?", "analysis"),
+    ("Apa penyebab tidak langsung dari kegagalan ini?", "analysis"),
+    ("Apa solusi yang diambil untuk mencegah kejadian serupa dengan insiden keboncoran minyak rem?", "analysis"),
+    ("Kapan dan di mana insiden ini terjadi?", "lookup"),
+    ("Berapa total kerugian yang ditimbulkan atas insiden kebocoran minyak rem?", "lookup"),
+    ("Berapa nomor Dokumen SOP verifikasi torsi harian wajib?", "lookup"),
+    ("Kapan verifikasi torsi wajib dilakukan?", "lookup"),
+    ("Apa definisi dari “Master Torque Checker”?", "lookup"),
+    ("Berapa nomor dokumen Panduan Pelaksanaan Kampanye Budaya?", "lookup"),
+    ("Apa itu Layered Process Audit (LPA)?", "lookup"),
+    ("Siapa saja yang terlibat dalam tim RCA pada insiden Kebocoran Minyak Rem ?", "standard"),
+    ("Apa yang terjadi jika hasil verifikasi ulang menunjukkan alat masih dalam kondisi baik?", "standard"),
+]
+
+
+@pytest.fixture
+def routing_file(app_module, tmp_path, monkeypatch):
+    """Points the app at a temporary routing config; returns a function that (re)writes it."""
+    path = tmp_path / "model_routing.json"
+    monkeypatch.setattr(app_module, "ROUTING_CONFIG_PATH", str(path))
+    monkeypatch.setattr(app_module, "routing_config", app_module.DEFAULT_ROUTING_CONFIG)
+    monkeypatch.setattr(app_module, "routing_config_mtime", None)
+    writes = []
+
+    def write(config):
+        path.write_text(config if isinstance(config, str) else json.dumps(config))
+        # Give every write a distinct mtime, even within the filesystem's timestamp resolution
+        writes.append(None)
+        os.utime(path, (1_000_000 + len(writes), 1_000_000 + len(writes)))
+
+    return write
+
+
+@pytest.mark.parametrize("question, expected_route", EXAMPLE_ROUTES)
+def test_example_questions_are_routed(app_module, routing_file, question, expected_route):
+    assert question in app_module.SYSTEM_INSTRUCTION_TEXT
+    routing_file(SHIPPED_CONFIG)
+
+    route_name, route = app_module.route_question(question)
+
+    assert route_name == expected_route
+    assert route == SHIPPED_CONFIG["routes"][expected_route]
+
+
+def test_unclassified_questions_keep_the_baseline_model():
+    assert SHIPPED_CONFIG["routes"][SHIPPED_CONFIG["default_route"]] == {
+        "model": "gemini-2.0-flash-001", "max_output_tokens": 8192,
+    }
+
+
+def test_missing_config_uses_single_baseline_route(app_module, routing_file):
+    assert app_module.route_question("Apa akar masalah kebocoran?") == (
+        "default", {"model": app_module.GEMINI_MODEL_NAME, "max_output_tokens": 8192},
+    )
+
+
+def test_config_changes_are_picked_up_without_restart(app_module, routing_file):
+    question = "Kapan verifikasi torsi wajib dilakukan?"
+    routing_file(SHIPPED_CONFIG)
+    assert app_module.route_question(question)[0] == "lookup"
+
+    edited = copy.deepcopy(SHIPPED_CONFIG)
+    edited["heuristic"]["lookup_max_words"] = 3
+    routing_file(edited)
+    assert app_module.route_question(question)[0] == "standard"
+
+
+def test_keywords_are_matched_case_insensitively(app_module, routing_file):
+    config = copy.deepcopy(SHIPPED_CONFIG)
+    config["heuristic"]["analysis_keywords"] = ["RCA"]
+    routing_file(config)
+
+    assert app_module.route_question("Siapa tim rca insiden ini?")[0] == "analysis"
+
+
+def set_key(path, value):
+    def mutate(config):
+        *parents, key = path
+        target = config
+        for parent in parents:
+            target = target[parent]
+        target[key] = value
+    return mutate
+
+
+INVALID_EDITS = {
+    "lookup_max_words as string": set_key(["heuristic", "lookup_max_words"], "12"),
+    "negative lookup_max_words": set_key(["heuristic", "lookup_max_words"], -1),
+    "keywords not a list": set_key(["heuristic", "analysis_keywords"], "analisis"),
+    "non-string keyword": set_key(["heuristic", "analysis_keywords"], ["analisis", 3]),
+    "unknown lookup_route": set_key(["heuristic", "lookup_route"], "tiny"),
+    "unknown analysis_route": set_key(["heuristic", "analysis_route"], "huge"),
+    "unknown default_route": set_key(["default_route"], "missing"),
+    "unknown router": set_key(["router"], "classifier"),
+    "route without model": set_key(["routes", "lookup"], {"max_output_tokens": 1024}),
+    "max_output_tokens as string": set_key(["routes", "lookup", "max_output_tokens"], "1024"),
+    "zero max_output_tokens": set_key(["routes", "lookup", "max_output_tokens"], 0),
+    "heuristic not an object": set_key(["heuristic"], []),
+}
+
+
+@pytest.mark.parametrize("mutate", INVALID_EDITS.values(), ids=INVALID_EDITS.keys())
+def test_invalid_edit_keeps_previous_config(app_module, routing_file, mutate):
+    routing_file(SHIPPED_CONFIG)
+    before = app_module.route_question("Kapan verifikasi torsi wajib dilakukan?")
+
+    broken = copy.deepcopy(SHIPPED_CONFIG)
+    mutate(broken)
+    routing_file(broken)
+
+    assert app_module.route_question("Kapan verifikasi torsi wajib dilakukan?") == before
+
+
+def test_malformed_json_keeps_previous_config(app_module, routing_file):
+    routing_file(SHIPPED_CONFIG)
+    assert app_module.route_question("Apa akar masalahnya?")[0] == "analysis"
+
+    routing_file("{not json")
+    assert app_module.route_question("Apa akar masalahnya?")[0] == "analysis"
+
+
+def test_chat_uses_route_and_records_it(app_module, routing_file, sessions_dir, fake_gemini):
+    routing_file(SHIPPED_CONFIG)
+    gemini = fake_gemini(chunks=["SOP - PROD - 012"])
+
+    response = app_module.app.test_client().post(
+        "/api/chat", json={"message": "Berapa nomor Dokumen SOP verifikasi torsi harian wajib?"})
+
+    assert response.status_code == 200
+    assert gemini.calls[0]["model"] == "gemini-2.5-flash-lite"
+    assert gemini.calls[0]["config"].max_output_tokens == 1024
+    bot = read_session(sessions_dir, response.get_json()["session_id"])["messages"][-1]
+    assert bot["route"] == "lookup"
+    assert bot["model"] == "gemini-2.5-flash-lite"
+    assert isinstance(bot["latency_ms"], int)